@@ -36,9 +36,9 @@ from builtins import range, str, zip
 from datetime import datetime
 from matplotlib.backends.backend_pdf import PdfPages
 from multiprocessing import Pool
-from scipy.stats import norm
 
-from .ddm import DDMTrial, DDM
+from .ddm import (DDMTrial, DDM, _get_state_space, _get_transition_kernels,
+                  _normcdf, _normpdf, _propagate)
 
 
 class FixationData:
@@ -188,38 +188,41 @@ class aDDM(DDM):
 
         # The values of the barriers can change over time.
         decay = 0  # decay = 0 means barriers are constant.
-        barrierUp = self.barrier * np.ones(numTimeSteps)
-        barrierDown = -self.barrier * np.ones(numTimeSteps)
-        for t in range(1, numTimeSteps):
-            barrierUp[t] = self.barrier / (1 + (decay * t))
-            barrierDown[t] = -self.barrier / (1 + (decay * t))
-
-        # Obtain correct state step.
-        halfNumStateBins = np.ceil(self.barrier / approxStateStep)
-        stateStep = self.barrier / (halfNumStateBins + 0.5)
+        if decay == 0:
+            barrierUp = np.full(numTimeSteps, self.barrier, dtype=np.float32)
+        else:
+            barrierUp = (self.barrier /
+                         (1 + decay * np.arange(numTimeSteps))).astype(
+                             np.float32)
+        barrierDown = -barrierUp
 
-        # The vertical axis is divided into states.
-        states = np.arange(barrierDown[0] + (stateStep / 2.),
-                           barrierUp[0] - (stateStep / 2.) + stateStep,
-                           stateStep)
+        # Obtain the discretized state space (cached across models and
+        # trials).
+        stateStep, states = _get_state_space(self.barrier, approxStateStep)
 
         # Find the state corresponding to the bias parameter.
         biasState = np.argmin(np.absolute(states - self.bias))
 
         # Initial probability for all states is zero, except the bias state,
         # for which the initial probability is one.
-        prStates = np.zeros((states.size, numTimeSteps))
+        prStates = np.zeros((states.size, numTimeSteps), dtype=np.float32)
         prStates[biasState,0] = 1
 
         # The probability of crossing each barrier over the time of the trial.
-        probUpCrossing = np.zeros(numTimeSteps)
-        probDownCrossing = np.zeros(numTimeSteps)
+        probUpCrossing = np.zeros(numTimeSteps, dtype=np.float32)
+        probDownCrossing = np.zeros(numTimeSteps, dtype=np.float32)
 
         time = 1
 
-        changeMatrix = np.subtract(states.reshape(states.size, 1), states)
-        changeUp = np.subtract(barrierUp, states.reshape(states.size, 1))
-        changeDown = np.subtract(barrierDown, states.reshape(states.size, 1))
+        if decay == 0:
+            insideBarriers = ((states < barrierUp[0]) &
+                              (states > barrierDown[0])).astype(np.float32)
+        else:
+            changeUp = np.subtract(barrierUp, states.reshape(states.size, 1))
+            changeDown = np.subtract(barrierDown,
+                                     states.reshape(states.size, 1))
+            kernelOffsets = np.arange(-(states.size - 1),
+                                      states.size) * stateStep
 
         # Iterate over all fixations in this trial.
         for fItem, fTime in zip(correctedFixItem, correctedFixTime):
@@ -236,49 +239,37 @@ class aDDM(DDM):
             else:
                 mean = 0
 
-            # Iterate over the time interval of this fixation.
-            for t in range(int(fTime // timeStep)):
-                # Update the probability of the states that remain inside the
-                # barriers. The probability of being in state B is the sum,
-                # over all states A, of the probability of being in A at the
-                # previous timestep times the probability of changing from A to
-                # B. We multiply the probability by the stateStep to ensure
-                # that the area under the curves for the probability
-                # distributions probUpCrossing and probDownCrossing add up to
-                # 1.
-                prStatesNew = (
-                    stateStep *
-                    np.dot(norm.pdf(changeMatrix, mean, self.sigma),
-                           prStates[:, time-1]))
-                prStatesNew[(states >= barrierUp[time]) |
-                            (states <= barrierDown[time])] = 0
-
-                # Calculate the probabilities of crossing the up barrier and
-                # the down barrier. This is given by the sum, over all states
-                # A, of the probability of being in A at the previous timestep
-                # times the probability of crossing the barrier if A is the
-                # previous state.
-                tempUpCross = np.dot(
-                    prStates[:, time-1],
-                    (1 - norm.cdf(changeUp[:, time], mean, self.sigma)))
-                tempDownCross = np.dot(
-                    prStates[:, time-1],
-                    norm.cdf(changeDown[:, time], mean, self.sigma))
-
-                # Renormalize to cope with numerical approximations.
-                sumIn = np.sum(prStates[:, time-1])
-                sumCurrent = np.sum(prStatesNew) + tempUpCross + tempDownCross
-                prStatesNew = prStatesNew * sumIn / sumCurrent
-                tempUpCross = tempUpCross * sumIn / sumCurrent
-                tempDownCross = tempDownCross * sumIn / sumCurrent
-
-                # Update the probabilities of each state and the probabilities
-                # of crossing each barrier at this timestep.
-                prStates[:, time] = prStatesNew
-                probUpCrossing[time] = tempUpCross
-                probDownCrossing[time] = tempDownCross
-
-                time += 1
+            numSteps = int(fTime // timeStep)
+            if numSteps < 1:
+                continue
+
+            if decay == 0:
+                # The kernels are fixed for the duration of the fixation,
+                # since the drift depends only on the fixated item, so the
+                # whole fixation is propagated with a single set of kernels
+                # fetched from the module-level cache (shared across the
+                # models of a grid search).
+                kernel, cdfs = _get_transition_kernels(
+                    mean, self.sigma, self.barrier, approxStateStep)
+                time = _propagate(kernel, cdfs, insideBarriers, prStates,
+                                  probUpCrossing, probDownCrossing, time,
+                                  numSteps)
+            else:
+                # With time-varying barriers the kernels change at every time
+                # step, so they are rebuilt and propagated one step at a time.
+                for t in range(numSteps):
+                    kernel = (stateStep * _normpdf(
+                        kernelOffsets, mean, self.sigma)).astype(np.float32)
+                    cdfs = np.empty((2, states.size), dtype=np.float32)
+                    cdfs[0] = 1 - _normcdf(changeUp[:, time], mean,
+                                           self.sigma)
+                    cdfs[1] = _normcdf(changeDown[:, time], mean, self.sigma)
+                    insideBarriers = ((states < barrierUp[time]) &
+                                      (states > barrierDown[time])).astype(
+                                          np.float32)
+                    time = _propagate(kernel, cdfs, insideBarriers,
+                                      prStates, probUpCrossing,
+                                      probDownCrossing, time, 1)
 
         # Compute the likelihood contribution of this trial based on the final
         # choice.
@@ -300,6 +291,27 @@ class aDDM(DDM):
         return likelihood
 
 
+    def get_model_likelihoods(self, trials, timeStep=10, stateStep=0.1):
+        """
+        Computes the likelihood of the data from a set of trials for these
+        particular model parameters. Unlike plain DDM trials, aDDM trials
+        with the same value difference do not share propagation dynamics
+        (the drift changes with each trial's fixation sequence), so the
+        likelihoods are computed one trial at a time.
+        Args:
+          trials: list of aDDMTrial objects.
+          timeStep: integer, value in milliseconds to be used for binning the
+              time axis.
+          stateStep: float, to be used for binning the RDV axis.
+        Returns:
+          A numpy array with the likelihoods obtained for the given trials.
+        """
+        return np.fromiter(
+            (self.get_trial_likelihood(trial, timeStep, stateStep)
+             for trial in trials),
+            dtype=np.float32, count=len(trials))
+
+
     def parallel_get_likelihoods(self, trials=None, timeStep=10, stateStep=0.1,
                                  numThreads=4):
         """
@@ -315,11 +327,15 @@ class aDDM(DDM):
           A list of likelihoods obtained for the given trials and model.
         """
         pool = Pool(numThreads)
+        # Hand each worker a chunk of trials at a time; the default chunksize
+        # of 1 would cost one IPC round trip per trial.
         likelihoods = pool.map(unwrap_addm_get_trial_likelihood,
                                zip([self] * len(trials),
                                    trials,
                                    [timeStep] * len(trials),
-                                   [stateStep] * len(trials)))
+                                   [stateStep] * len(trials)),
+                               chunksize=max(
+                                   1, len(trials) // (4 * numThreads)))
         pool.close()
         return likelihoods
 
@@ -43,12 +43,18 @@ from datetime import datetime
 from matplotlib.backends.backend_pdf import PdfPages
 
 from .addm import aDDM
+from .ddm import parallel_model_likelihoods
 from .util import (load_trial_conditions_from_csv, load_data_from_csv,
                    get_empirical_distributions, save_simulations_to_csv,
                    generate_choice_curves, generate_rt_curves,
                    convert_item_values)
 
 
+# Generator for the trial subsampling; choice with shuffle=False samples
+# without replacement without permuting the full index range.
+_rng = np.random.default_rng()
+
+
 def main(rangeD, rangeSigma, rangeTheta, trialsFileName=None,
          expdataFileName=None, fixationsFileName=None, trialsPerSubject=100,
          numSamples=100, numSimulations=800, subjectIds=[], numThreads=9,
@@ -100,60 +106,50 @@ def main(rangeD, rangeSigma, rangeTheta, trialsFileName=None,
     subjectIds = ([str(subj) for subj in subjectIds] if subjectIds
                   else list(data))
     for subjectId in subjectIds:
-        maxNumTrials = len(data[subjectId]) // 2
+        numSubjectTrials = len(data[subjectId])
+        maxNumTrials = numSubjectTrials // 2
         numTrials = (trialsPerSubject
                      if 1 <= trialsPerSubject <= maxNumTrials
                      else maxNumTrials)
-        trialSet = np.random.choice(
-            [trialId for trialId in range(len(data[subjectId]))
-             if trialId % 2], numTrials, replace=False)
+        trialSet = _rng.choice(np.arange(1, numSubjectTrials, 2),
+                               size=numTrials, replace=False, shuffle=False)
         dataTrials.extend([data[subjectId][t] for t in trialSet])
 
     # Create all models to be used in the grid search.
     numModels = (len(rangeD) * len(rangeTheta) * len(rangeSigma))
     models = list()
-    posteriors = dict()
     for d in rangeD:
         for sigma in rangeSigma:
             for theta in rangeTheta:
-                model = aDDM(d, sigma, theta)
-                models.append(model)
-                posteriors[model.params] = 1 / numModels
+                models.append(aDDM(d, sigma, theta))
 
-    # Get likelihoods for all models.
+    # Get likelihoods for all models, parallelizing over models.
     if verbose:
         print(u"Starting grid search...")
-    likelihoods = dict()
-    for model in models:
-        if verbose:
-            print(u"Computing likelihoods for model " + str(model.params) +
-                  u"...")
-        try:
-            likelihoods[model.params] = model.parallel_get_likelihoods(
-                dataTrials, numThreads=numThreads)
-        except:
-            print(u"An exception occurred during the likelihood "
-                  "computations for model " + str(model.params) + u".")
-            raise
+    try:
+        likelihoods = parallel_model_likelihoods(models, dataTrials,
+                                                 numThreads=numThreads)
+    except:
+        print(u"An exception occurred during the likelihood computations.")
+        raise
 
     if verbose:
         print(u"Finished grid search!")
 
-    # Compute posterior distribution over all models.
+    # Compute posterior distribution over all models, keeping the models'
+    # posteriors and likelihoods in parallel arrays so that each trial's
+    # Bayesian update is a vectorized operation over all models.
+    likelihoodsArray = np.array(
+        [likelihoods[model.params] for model in models])
+    posteriorsArray = np.full(numModels, 1 / numModels)
     for t in range(len(dataTrials)):
-        # Get the denominator for normalizing the posteriors.
-        denominator = 0
-        for model in models:
-            denominator += (posteriors[model.params] *
-                            likelihoods[model.params][t])
+        posteriorTimesLikelihood = posteriorsArray * likelihoodsArray[:, t]
+        denominator = np.sum(posteriorTimesLikelihood)
         if denominator == 0:
             continue
-
-        # Calculate the posteriors after this trial.
-        for model in models:
-            prior = posteriors[model.params]
-            posteriors[model.params] = (likelihoods[model.params][t] * prior /
-                                        denominator)
+        posteriorsArray = posteriorTimesLikelihood / denominator
+    posteriors = dict(zip([model.params for model in models],
+                          posteriorsArray))
 
     if verbose:
         for model in models:
@@ -167,19 +163,15 @@ def main(rangeD, rangeSigma, rangeTheta, trialsFileName=None,
         data, subjectIds=subjectIds, useOddTrials=False, useEvenTrials=True,
         maxFixTime=3000)
 
-    # Get list of posterior distribution values.
-    posteriorsList = list()
-    for model in models:
-        posteriorsList.append(posteriors[model.params])
-
     # Generate probabilistic set of simulations using the posterior
-    # distribution.
+    # distribution. All model samples are drawn up front from the posteriors
+    # array, instead of rebuilding the index and probability arrays for each
+    # sample.
+    modelIndexes = _rng.choice(numModels, size=numSamples, p=posteriorsArray)
     simulTrials = list()
     for s in range(numSamples):
         # Sample model from posteriors distribution.
-        modelIndex = np.random.choice(
-            np.array(list(range(numModels))), p=np.array(posteriorsList))
-        model = models[modelIndex]
+        model = models[modelIndexes[s]]
         for (valueLeft, valueRight) in trialConditions:
             for t in range(numSimulations):
                 try:
@@ -41,12 +41,18 @@ from datetime import datetime
 from matplotlib.backends.backend_pdf import PdfPages
 
 from .addm import aDDM
+from .ddm import parallel_model_likelihoods
 from .util import (load_trial_conditions_from_csv, load_data_from_csv,
                    get_empirical_distributions, save_simulations_to_csv,
                    generate_choice_curves, generate_rt_curves,
                    convert_item_values)
 
 
+# Generator for the trial subsampling; choice with shuffle=False samples
+# without replacement without permuting the full index range.
+_rng = np.random.default_rng()
+
+
 def main(rangeD, rangeSigma, rangeTheta, trialsFileName=None,
          expdataFileName=None, fixationsFileName=None, trialsPerSubject=100,
          simulationsPerCondition=800, subjectIds=[], numThreads=9,
@@ -95,13 +101,13 @@ def main(rangeD, rangeSigma, rangeTheta, trialsFileName=None,
     subjectIds = ([str(subj) for subj in subjectIds] if subjectIds
                   else list(data))
     for subjectId in subjectIds:
-        maxNumTrials = len(data[subjectId]) // 2
+        numSubjectTrials = len(data[subjectId])
+        maxNumTrials = numSubjectTrials // 2
         numTrials = (trialsPerSubject
                      if 1 <= trialsPerSubject <= maxNumTrials
                      else maxNumTrials)
-        trialSet = np.random.choice(
-            [trialId for trialId in range(len(data[subjectId]))
-             if trialId % 2], numTrials, replace=False)
+        trialSet = _rng.choice(np.arange(1, numSubjectTrials, 2),
+                               size=numTrials, replace=False, shuffle=False)
         dataTrials.extend([data[subjectId][t] for t in trialSet])
 
     # Create all models to be used in the grid search.
@@ -111,26 +117,21 @@ def main(rangeD, rangeSigma, rangeTheta, trialsFileName=None,
             for theta in rangeTheta:
                 models.append(aDDM(d, sigma, theta))
 
-    # Get likelihoods for all models.
+    # Get likelihoods for all models, parallelizing over models.
     if verbose:
         print(u"Starting grid search...")
-    likelihoods = dict()
-    for model in models:
-        if verbose:
-            print(u"Computing likelihoods for model " + str(model.params) +
-                  u"...")
-        try:
-            likelihoods[model.params] = model.parallel_get_likelihoods(
-                dataTrials, numThreads=numThreads)
-        except:
-            print(u"An exception occurred during the likelihood "
-                  "computations for model " + str(model.params) + u".")
-            raise
+    try:
+        likelihoods = parallel_model_likelihoods(models, dataTrials,
+                                                 numThreads=numThreads)
+    except:
+        print(u"An exception occurred during the likelihood computations.")
+        raise
 
     # Get negative log likelihoods and optimal parameters.
     NLL = dict()
     for model in models:
-        NLL[model.params] = - np.sum(np.log(likelihoods[model.params]))
+        NLL[model.params] = - np.sum(np.log(likelihoods[model.params],
+                                            dtype=np.float64))
     optimalParams = min(NLL, key=NLL.get)
 
     if verbose:
@@ -38,6 +38,7 @@ import pkg_resources
 from builtins import range, str
 
 from .addm import aDDM
+from .ddm import parallel_model_likelihoods
 from .util import (load_trial_conditions_from_csv, load_data_from_csv,
                    get_empirical_distributions, convert_item_values)
 
@@ -102,43 +103,39 @@ def main(d, sigma, theta, rangeD, rangeSigma, rangeTheta, trialsFileName=None,
                       str(valueLeft) + u", " + str(valueRight) + u").")
                 raise
 
-    # Get likelihoods for all models and all artificial trials.
+    # Create all models to be used in the grid search.
     numModels = (len(rangeD) * len(rangeSigma) * len(rangeTheta))
-    likelihoods = dict()
     models = list()
-    posteriors = dict()
     for d in rangeD:
         for sigma in rangeSigma:
             for theta in rangeTheta:
-                model = aDDM(d, sigma, theta)
-                if verbose:
-                    print(u"Computing likelihoods for model " +
-                          str(model.params) + u"...")
-                try:
-                    likelihoods[model.params] = model.parallel_get_likelihoods(
-                        trials, numThreads=numThreads)
-                except:
-                    print(u"An exception occurred during the likelihood "
-                          "computations for model " + str(model.params) + u".")
-                    raise
-                models.append(model)
-                posteriors[model.params] = 1 / numModels
-
-    # Compute the posteriors.
+                models.append(aDDM(d, sigma, theta))
+
+    # Get likelihoods for all models and all artificial trials, parallelizing
+    # over models.
+    if verbose:
+        print(u"Computing likelihoods for all models...")
+    try:
+        likelihoods = parallel_model_likelihoods(models, trials,
+                                                 numThreads=numThreads)
+    except:
+        print(u"An exception occurred during the likelihood computations.")
+        raise
+
+    # Compute the posteriors, keeping the models' posteriors and likelihoods
+    # in parallel arrays so that each trial's Bayesian update is a vectorized
+    # operation over all models.
+    likelihoodsArray = np.array(
+        [likelihoods[model.params] for model in models])
+    posteriorsArray = np.full(numModels, 1 / numModels)
     for t in range(len(trials)):
-        # Get the denominator for normalizing the posteriors.
-        denominator = 0
-        for model in models:
-            denominator += (posteriors[model.params] *
-                            likelihoods[model.params][t])
+        posteriorTimesLikelihood = posteriorsArray * likelihoodsArray[:, t]
+        denominator = np.sum(posteriorTimesLikelihood)
         if denominator == 0:
             continue
-
-        # Calculate the posteriors after this trial.
-        for model in models:
-            prior = posteriors[model.params]
-            posteriors[model.params] = (likelihoods[model.params][t] *
-                                        prior / denominator)
+        posteriorsArray = posteriorTimesLikelihood / denominator
+    posteriors = dict(zip([model.params for model in models],
+                          posteriorsArray))
 
     if verbose:
         for model in models:
@@ -34,8 +34,9 @@ from __future__ import absolute_import, division
 import numpy as np
 import pkg_resources
 
-from builtins import range, str
-from scipy.optimize import basinhopping
+from builtins import range, str, zip
+from multiprocessing import Pool
+from scipy.optimize import basinhopping, differential_evolution, minimize
 
 from .addm import aDDM
 from .util import load_data_from_csv, convert_item_values
@@ -43,6 +44,49 @@ from .util import load_data_from_csv, convert_item_values
 
 # Global variables.
 dataTrials = []
+pool = None
+poolChunkRanges = []
+verboseNLL = False
+nllHistory = list()
+
+# Cache mapping rounded parameter tuples to previously computed NLLs. Basin
+# hopping and the L-BFGS-B line searches frequently re-evaluate the objective
+# at parameter vectors they have already visited (accept tests, repeated line
+# search points); identical queries short-circuit here instead of sweeping
+# the full trial set again. The trial subset is fixed for the whole run, so
+# the parameters alone identify the objective value. The cache is cleared in
+# main, and whenever it grows past _maxNLLCacheSize.
+_nllCache = dict()
+_maxNLLCacheSize = 256
+
+
+def _init_worker(trials):
+    """
+    Initializes a pool worker by storing the trial data in the module-level
+    global. The data is shipped to each worker exactly once, when the pool is
+    created, instead of being pickled into every map task of every NLL
+    evaluation.
+    Args:
+      trials: list of aDDMTrial objects.
+    """
+    global dataTrials
+    dataTrials = trials
+
+
+def get_chunk_likelihoods(args):
+    """
+    Computes the likelihoods for a contiguous chunk of the worker's trial
+    data. Only the model and the chunk boundaries cross the process boundary;
+    the trials themselves are read from the worker-local global set up by
+    _init_worker.
+    Args:
+      args: tuple (model, start, end), where model is an aDDM object and
+          start and end are ints delimiting the chunk of trials.
+    Returns:
+      A numpy array with the likelihoods for the trials in the chunk.
+    """
+    model, start, end = args
+    return model.get_model_likelihoods(dataTrials[start:end])
 
 
 def get_model_nll(params):
@@ -51,38 +95,116 @@ def get_model_nll(params):
     parameters of the aDDM.
     Args:
       params: list containing the 3 model parameters, in the following order:
-          d, theta, sigma.
+          d, sigma, theta.
     Returns:
       The negative log likelihood for the global data set and the given model.
     """
     d = params[0]
     sigma = params[1]
     theta = params[2]
-    model = aDDM(d, sigma, theta) 
-
-    logLikelihood = 0
-    for trial in dataTrials:
-        try:
-            likelihood = model.get_trial_likelihood(trial)
-        except:
-            print(u"An exception occurred during the likelihood " +
-                  "computations for model " + str(model.params) + u".")
-            raise
-        if likelihood != 0:
-            logLikelihood += np.log(likelihood)
-
-    print(u"NLL for " + str(params) + u": " + str(-logLikelihood))
-    if logLikelihood != 0:
-        return -logLikelihood
-    else:
-        return float("inf")
+
+    cacheKey = (round(d, 9), round(sigma, 9), round(theta, 9))
+    if cacheKey in _nllCache:
+        return _nllCache[cacheKey]
+
+    model = aDDM(d, sigma, theta)
+
+    try:
+        # The module-level pool is created once in main and reused across all
+        # NLL evaluations, so the worker startup cost is not paid on every
+        # basin hopping step. Each map task carries only the model and chunk
+        # boundaries; the trials live in the workers already, and the chunk
+        # ranges are precomputed in main since the trial set is fixed.
+        if pool is not None:
+            likelihoods = np.concatenate(pool.map(
+                get_chunk_likelihoods,
+                [(model, start, end) for start, end in poolChunkRanges]))
+        else:
+            likelihoods = model.get_model_likelihoods(dataTrials)
+    except:
+        print(u"An exception occurred during the likelihood " +
+              "computations for model " + str(model.params) + u".")
+        raise
+    # The likelihoods are float32; the log sum accumulates in float64 to
+    # avoid cancellation across many small terms.
+    logLikelihood = np.sum(np.log(likelihoods[likelihoods != 0],
+                                  dtype=np.float64))
+
+    NLL = -logLikelihood if logLikelihood != 0 else float(u"inf")
+
+    # Printing on every call serializes the optimizer on terminal I/O across
+    # the thousands of evaluations of a basin hopping run; the evaluations
+    # are recorded instead, and printed only in verbose mode.
+    nllHistory.append((list(params), NLL))
+    if verboseNLL:
+        print(u"NLL for " + str(params) + u": " + str(NLL))
+    if len(_nllCache) >= _maxNLLCacheSize:
+        _nllCache.clear()
+    _nllCache[cacheKey] = NLL
+    return NLL
+
+
+def get_model_nll_and_gradient(params):
+    """
+    Computes the negative log likelihood of the global data set given the
+    parameters of the aDDM, together with a forward-difference approximation
+    of its gradient. Returning both from a single function lets the L-BFGS-B
+    minimizer (jac=True) share the base NLL evaluation across the parameter
+    perturbations, instead of re-evaluating it for each one.
+    Args:
+      params: list containing the 3 model parameters, in the following order:
+          d, sigma, theta.
+    Returns:
+      A tuple (NLL, gradient), where NLL is the negative log likelihood for
+          the global data set and the given model, and gradient is a numpy
+          array with the forward-difference derivatives of the NLL with
+          respect to each parameter.
+    """
+    # The likelihoods come out of a float32 propagation, so the objective is
+    # only accurate to roughly the float32 machine epsilon; the forward
+    # difference step is scaled to its square root (~3.5e-4 relative). A
+    # float64-sized step would sit below the objective's noise floor and
+    # produce garbage derivatives.
+    stepScale = np.sqrt(np.finfo(np.float32).eps)
+
+    baseNLL = get_model_nll(params)
+    gradient = np.zeros(len(params))
+    if not np.isfinite(baseNLL):
+        return baseNLL, gradient
+    for p in range(len(params)):
+        step = stepScale * max(1.0, abs(params[p]))
+        perturbedParams = np.array(params, dtype=np.float64)
+        perturbedParams[p] += step
+        gradient[p] = (get_model_nll(perturbedParams) - baseNLL) / step
+    return baseNLL, gradient
+
+
+def run_local_minimizer(args):
+    """
+    Runs a single bounded L-BFGS-B minimization of the negative log
+    likelihood. This function should stay outside main, allowing it to be
+    pickled (as required by multiprocessing).
+    Args:
+      args: tuple (initialParams, bounds, options), where initialParams is a
+          list containing the starting values for the 3 model parameters,
+          bounds is a list of (lower, upper) tuples for each parameter and
+          options is a dict of L-BFGS-B options.
+    Returns:
+      The scipy OptimizeResult of the minimization.
+    """
+    initialParams, bounds, options = args
+    return minimize(get_model_nll_and_gradient, initialParams,
+                    method=u"L-BFGS-B", jac=True, bounds=bounds,
+                    options=options)
 
 
 def main(initialD, initialSigma, initialTheta, lowerBoundD=0.0001,
          upperBoundD=0.09, lowerBoundSigma=0.001, upperBoundSigma=0.9,
          lowerBoundTheta=0, upperBoundTheta=1, expdataFileName=None,
          fixationsFileName=None, trialsPerSubject=100, numIterations=100,
-         stepSize=0.001, subjectIds=[], verbose=False):
+         stepSize=0.001, subjectIds=[], numThreads=9, randomSeed=None,
+         numStarts=1, optimizer=u"basinhopping", minimizerMaxiter=30,
+         minimizerFtol=1e-3, minimizerGtol=1e-2, verbose=False):
     """
     Args:
       initialD: float, initial value for parameter d.
@@ -103,9 +225,48 @@ def main(initialD, initialSigma, initialTheta, lowerBoundD=0.0001,
           basin hopping algorithm.
       subjectIds: list of strings corresponding to the subject ids. If not
           provided, all existing subjects will be used.
+      numThreads: int, size of the thread pool.
+      randomSeed: int, seed for the random number generator. When provided,
+          the trial subset used in the objective function (and therefore the
+          whole optimization) is reproducible.
+      numStarts: int, number of start points for the optimization. When
+          larger than 1, the basin hopping algorithm is replaced by a
+          portfolio of independent L-BFGS-B minimizations from random start
+          points, run in parallel, of which the best result is kept.
+      optimizer: string, global optimization algorithm to use, either
+          "basinhopping" or "differential_evolution". Differential evolution
+          evaluates whole populations at a time, which parallelizes better
+          than the sequential basin hopping steps. Ignored when numStarts is
+          larger than 1.
+      minimizerMaxiter: int, maximum number of L-BFGS-B iterations per local
+          minimization. The scipy default (15000) burns budget inside a
+          single basin; a small cap spreads it over more hops instead.
+      minimizerFtol: float, relative tolerance on the NLL for L-BFGS-B
+          convergence. The objective is evaluated from a discretized
+          propagation, so tolerances tighter than its resolution only add
+          evaluations.
+      minimizerGtol: float, tolerance on the projected gradient for L-BFGS-B
+          convergence.
       verbose: boolean, whether or not to increase output verbosity.
     """
-    global dataTrials
+    global dataTrials, pool, poolChunkRanges, verboseNLL
+    verboseNLL = verbose
+
+    # Reset the per-run globals, so that a second in-process call does not
+    # report evaluations (or reuse cached NLLs) from a previous run, extend
+    # the previous run's trial set, or map over its closed pool.
+    del nllHistory[:]
+    _nllCache.clear()
+    del dataTrials[:]
+    pool = None
+    poolChunkRanges = []
+
+    if randomSeed is not None:
+        np.random.seed(randomSeed)
+    # Generator for the trial subsampling and the start points. Unlike the
+    # legacy np.random.choice, Generator.choice with shuffle=False samples
+    # without replacement without permuting the full index range.
+    rng = np.random.default_rng(randomSeed)
 
     # Load experimental data from CSV file.
     if verbose:
@@ -119,15 +280,17 @@ def main(initialD, initialSigma, initialTheta, lowerBoundD=0.0001,
     data = load_data_from_csv(expdataFileName, fixationsFileName,
                               convertItemValues=convert_item_values)
 
-    # Get correct subset of trials.
+    # Get correct subset of trials. The subset is sampled once, before the
+    # optimization starts, so that the objective function is deterministic
+    # across NLL evaluations; resampling inside get_model_nll would break the
+    # finite-difference gradients used by the L-BFGS-B minimizer.
     subjectIds = ([str(subj) for subj in subjectIds] if subjectIds
                   else list(data))
     for subjectId in subjectIds:
         numTrials = (trialsPerSubject if trialsPerSubject >= 1
                      else len(data[subjectId]))
-        trialSet = np.random.choice(
-            [trialId for trialId in range(len(data[subjectId]))],
-            numTrials, replace=False)
+        trialSet = rng.choice(len(data[subjectId]), size=numTrials,
+                              replace=False, shuffle=False)
         dataTrials.extend([data[subjectId][t] for t in trialSet])
 
     # Initial guess for the parameters: d, sigma, theta.
@@ -139,9 +302,65 @@ def main(initialD, initialSigma, initialTheta, lowerBoundD=0.0001,
               (lowerBoundTheta, upperBoundTheta)
              ]
 
-    # Optimize using Basinhopping algorithm.
-    minimizerKwargs = dict(method=u"L-BFGS-B", bounds=bounds)
-    result = basinhopping(
-        get_model_nll, initialParams, minimizer_kwargs=minimizerKwargs,
-        niter=numIterations,stepsize=stepSize)
+    # Options for the L-BFGS-B local minimizations.
+    minimizerOptions = dict(maxiter=minimizerMaxiter, ftol=minimizerFtol,
+                            gtol=minimizerGtol)
+
+    if numStarts > 1:
+        # Run a portfolio of independent local minimizations from random
+        # start points in parallel, and keep the best result. Unlike the
+        # serial basin hopping outer loop, the starts are embarrassingly
+        # parallel; each worker evaluates its NLLs serially.
+        starts = [initialParams]
+        for s in range(numStarts - 1):
+            starts.append([rng.uniform(lower, upper)
+                           for (lower, upper) in bounds])
+        startsPool = Pool(min(numThreads, numStarts),
+                          initializer=_init_worker, initargs=(dataTrials,))
+        results = startsPool.map(run_local_minimizer,
+                                 zip(starts, [bounds] * numStarts,
+                                     [minimizerOptions] * numStarts))
+        startsPool.close()
+        result = min(results, key=lambda res: res.fun)
+    elif optimizer == u"differential_evolution":
+        # Differential evolution evaluates an entire population per
+        # generation, so with deferred updating the population can be mapped
+        # over the pool in one go. The workers evaluate their NLLs serially
+        # over the trial data handed to them by the initializer; the final
+        # L-BFGS-B polish runs in this process.
+        dePool = Pool(numThreads, initializer=_init_worker,
+                      initargs=(dataTrials,))
+        result = differential_evolution(
+            get_model_nll, bounds=bounds, maxiter=numIterations, tol=1e-4,
+            polish=False, updating=u"deferred", workers=dePool.map,
+            seed=randomSeed)
+        dePool.close()
+        # Refine the best candidate with the shared L-BFGS-B wrapper rather
+        # than scipy's built-in polish, whose default finite-difference step
+        # sits below the float32 objective's noise floor.
+        polished = run_local_minimizer((result.x, bounds, minimizerOptions))
+        if polished.fun <= result.fun:
+            result = polished
+    else:
+        # Optimize using Basinhopping algorithm. The thread pool is created
+        # once and reused by all NLL evaluations across the basin hopping
+        # iterations; the initializer hands the trial data to each worker a
+        # single time. A few chunks per worker keep the load balanced when
+        # trials have very different RTs.
+        pool = Pool(numThreads, initializer=_init_worker,
+                    initargs=(dataTrials,))
+        chunkBounds = np.linspace(0, len(dataTrials),
+                                  4 * numThreads + 1).astype(int)
+        poolChunkRanges = list(zip(chunkBounds[:-1], chunkBounds[1:]))
+        minimizerKwargs = dict(method=u"L-BFGS-B", jac=True, bounds=bounds,
+                               options=minimizerOptions)
+        result = basinhopping(
+            get_model_nll_and_gradient, initialParams,
+            minimizer_kwargs=minimizerKwargs, niter=numIterations,
+            stepsize=stepSize)
+        pool.close()
+        pool = None
+    if nllHistory:
+        print(u"Best NLL over " + str(len(nllHistory)) +
+              u" evaluations: " + str(min(nll for _, nll in nllHistory)))
     print(u"Optimization result: " + str(result))
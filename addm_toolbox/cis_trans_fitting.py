@@ -41,11 +41,17 @@ from datetime import datetime
 from multiprocessing import Pool
 
 from .addm import aDDM
+from .ddm import parallel_model_likelihoods
 from .util import (load_data_from_csv, get_empirical_distributions,
                    save_simulations_to_csv, generate_choice_curves,
                    generate_rt_curves, convert_item_values)
 
 
+# Generator for the trial subsampling; choice with shuffle=False samples
+# without replacement without permuting the full index range.
+_rng = np.random.default_rng()
+
+
 def main(rangeD, rangeSigma, rangeTheta, expdataFileName=None,
          fixationsFileName=None, trialsPerSubject=100,
          simulationsPerCondition=400, subjectIds=[], numThreads=9,
@@ -91,26 +97,25 @@ def main(rangeD, rangeSigma, rangeTheta, expdataFileName=None,
     subjectIds = ([str(subj) for subj in subjectIds] if subjectIds
                   else list(data))
     for subjectId in subjectIds:
+        numSubjectTrials = len(data[subjectId])
         numTrials = (trialsPerSubject if trialsPerSubject >= 1
-                     else len(data[subjectId]))
-        isCisTrial = [True if trial.valueLeft * trial.valueRight >= 0
-                      else False for trial in data[subjectId]]
-        isTransTrial = [True if trial.valueLeft * trial.valueRight <= 0
-                        else False for trial in data[subjectId]]
+                     else numSubjectTrials)
+        # Candidate indices are built once per subject as numpy arrays; the
+        # cis/trans masks are boolean filters over the odd-trial indices.
+        oddTrials = np.arange(1, numSubjectTrials, 2)
+        valueProducts = np.array([trial.valueLeft * trial.valueRight
+                                  for trial in data[subjectId]])
         if useCisTrials and useTransTrials:
-            trialSet = np.random.choice(
-                [trialId for trialId in list(range(len(data[subjectId])))
-                 if trialId % 2], numTrials, replace=False)
+            trialSet = _rng.choice(oddTrials, size=numTrials, replace=False,
+                                   shuffle=False)
         elif useCisTrials and not useTransTrials:
-            trialSet = np.random.choice(
-                [trialId for trialId in list(range(len(data[subjectId])))
-                 if trialId % 2 and isCisTrial[trialId]], numTrials,
-                replace=False)
+            trialSet = _rng.choice(
+                oddTrials[valueProducts[oddTrials] >= 0], size=numTrials,
+                replace=False, shuffle=False)
         elif not useCisTrials and useTransTrials:
-            trialSet = np.random.choice(
-                [trialId for trialId in list(range(len(data[subjectId])))
-                 if trialId % 2 and isTransTrial[trialId]], numTrials,
-                replace=False)
+            trialSet = _rng.choice(
+                oddTrials[valueProducts[oddTrials] <= 0], size=numTrials,
+                replace=False, shuffle=False)
         else:
             return
         dataTrials.extend([data[subjectId][t] for t in trialSet])
@@ -122,26 +127,21 @@ def main(rangeD, rangeSigma, rangeTheta, expdataFileName=None,
             for theta in rangeTheta:
                 models.append(aDDM(d, sigma, theta))
 
-    # Get likelihoods for all models.
+    # Get likelihoods for all models, parallelizing over models.
     if verbose:
         print(u"Starting grid search...")
-    likelihoods = dict()
-    for model in models:
-        if verbose:
-            print(u"Computing likelihoods for model " + str(model.params) +
-                  u"...")
-        try:
-            likelihoods[model.params] = model.parallel_get_likelihoods(
-                dataTrials, numThreads=numThreads)
-        except:
-            print(u"An exception occurred during the likelihood "
-                  "computations for model " + str(model.params) + u".")
-            raise
+    try:
+        likelihoods = parallel_model_likelihoods(models, dataTrials,
+                                                 numThreads=numThreads)
+    except:
+        print(u"An exception occurred during the likelihood computations.")
+        raise
 
     # Get negative log likelihoods and optimal parameters.
     NLL = dict()
     for model in models:
-        NLL[model.params] = - np.sum(np.log(likelihoods[model.params]))
+        NLL[model.params] = - np.sum(np.log(likelihoods[model.params],
+                                            dtype=np.float64))
     optimalParams = min(NLL, key=NLL.get)
 
     if verbose:
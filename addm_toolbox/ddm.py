@@ -36,7 +36,284 @@ from builtins import range, str, zip
 from datetime import datetime
 from matplotlib.backends.backend_pdf import PdfPages
 from multiprocessing import Pool
-from scipy.stats import norm
+from scipy.special import erf
+
+# numba is an optional dependency: when it is available, the likelihood
+# recurrence is JIT-compiled, which removes the per-time-step numpy dispatch
+# overhead from the hot loop.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+# Module-level caches shared across models and trials. During a grid search
+# the state grid depends only on the barrier magnitude and the state step,
+# and the transition kernels depend only on the mean and standard deviation
+# of the RDV changes, so the same arrays are needed over and over for every
+# trial of every model; memoizing them amortizes that work across the grid.
+_maxKernelCacheSize = 1024
+_stateSpaceCache = dict()
+_pdfKernelCache = dict()
+_cdfCache = dict()
+
+# Once the probability mass remaining inside the barriers drops below this
+# tolerance, further time steps cannot meaningfully change the crossing
+# probabilities and the propagation loop exits early.
+_probMassTolerance = 1e-9
+
+# The renormalization that copes with the mass lost to the kernel truncation
+# only runs when the relative conservation error exceeds this tolerance, or
+# after this many consecutive steps without one.
+_renormTolerance = 1e-6
+_renormInterval = 50
+
+_sqrt2 = np.sqrt(2)
+_sqrt2pi = np.sqrt(2 * np.pi)
+
+
+def _normpdf(x, mean, sigma):
+    """
+    Probability density function of the normal distribution. Equivalent to
+    scipy.stats.norm.pdf, but without the argument validation and distribution
+    dispatch overhead, which dominates for small arrays.
+    Args:
+      x: number or numpy array, point(s) where the density is evaluated.
+      mean: float, mean of the distribution.
+      sigma: float, standard deviation of the distribution.
+    Returns:
+      The density of the distribution at x.
+    """
+    z = (x - mean) / sigma
+    return np.exp(-0.5 * z * z) / (sigma * _sqrt2pi)
+
+
+def _normcdf(x, mean, sigma):
+    """
+    Cumulative distribution function of the normal distribution. Equivalent to
+    scipy.stats.norm.cdf, but without the argument validation and distribution
+    dispatch overhead, which dominates for small arrays.
+    Args:
+      x: number or numpy array, point(s) where the cumulative distribution is
+          evaluated.
+      mean: float, mean of the distribution.
+      sigma: float, standard deviation of the distribution.
+    Returns:
+      The cumulative probability of the distribution up to x.
+    """
+    return 0.5 * (1 + erf((x - mean) / (sigma * _sqrt2)))
+
+
+def _get_state_space(barrier, approxStateStep):
+    """
+    Computes (and caches) the discretized state space of the RDV signal.
+    Args:
+      barrier: positive number, magnitude of the signal thresholds.
+      approxStateStep: float, to be used for binning the RDV axis.
+    Returns:
+      A tuple (stateStep, states), where stateStep is the actual value used
+          for binning the RDV axis and states is a numpy array with the
+          binned RDV axis. The returned array is read-only, since it is
+          shared across calls.
+    """
+    key = (barrier, approxStateStep)
+    if key not in _stateSpaceCache:
+        # Obtain correct state step.
+        halfNumStateBins = np.ceil(barrier / approxStateStep)
+        stateStep = barrier / (halfNumStateBins + 0.5)
+
+        # The vertical axis is divided into states. Probabilities are kept in
+        # float32: the per-step renormalization keeps the recurrence well
+        # conditioned at that precision, and the narrower arrays halve the
+        # memory traffic of the hot loop.
+        states = np.arange(-barrier + (stateStep / 2),
+                           barrier - (stateStep / 2) + stateStep,
+                           stateStep).astype(np.float32)
+        states.setflags(write=False)
+        _stateSpaceCache[key] = (stateStep, states)
+    return _stateSpaceCache[key]
+
+
+def _get_transition_kernels(mean, sigma, barrier, approxStateStep):
+    """
+    Computes (and caches) the state transition matrix and the barrier-crossing
+    probability vectors, assuming constant barriers.
+    Args:
+      mean: float, mean of the normal distribution modeling RDV changes.
+      sigma: float, standard deviation of the normal distribution modeling RDV
+          changes.
+      barrier: positive number, magnitude of the signal thresholds.
+      approxStateStep: float, to be used for binning the RDV axis.
+    Returns:
+      A tuple (kernel, cdfs), where kernel is a 1-dimensional numpy array
+          with the probabilities of moving between states as a function of
+          the (signed) distance between them (scaled by the state step), and
+          cdfs is a 2 x S numpy array whose rows are the probabilities of
+          crossing the upper and the lower barrier from each of the S states.
+          The returned arrays are read-only, since they are shared across
+          calls.
+    """
+    stateStep, states = _get_state_space(barrier, approxStateStep)
+
+    # The transition probability depends only on the (integer) offset between
+    # states, so the kernel is a lookup table of pdf values by offset. The
+    # number of states enters the key because it clamps the kernel half-width
+    # below; two grids with the same spacing but different barriers must not
+    # share a kernel truncated to the wrong width.
+    kernelKey = (mean, sigma, stateStep, states.size)
+    if kernelKey not in _pdfKernelCache:
+        if len(_pdfKernelCache) >= _maxKernelCacheSize:
+            _pdfKernelCache.clear()
+
+        # The full transition matrix is a Toeplitz matrix and the
+        # matrix-vector product in the recurrence is a 1-dimensional
+        # convolution with this kernel. The Gaussian has negligible mass
+        # beyond 6 standard deviations from its mean, so the kernel is
+        # truncated there.
+        halfWidth = min(int(np.ceil((6 * sigma + abs(mean)) / stateStep)),
+                        states.size - 1)
+        offsets = np.arange(-halfWidth, halfWidth + 1) * stateStep
+        kernel = (stateStep * _normpdf(offsets, mean, sigma)).astype(
+            np.float32)
+        kernel.setflags(write=False)
+        _pdfKernelCache[kernelKey] = kernel
+
+    # The crossing probabilities depend on the distances between the states
+    # and the barriers, so they are keyed by the grid itself.
+    cdfKey = (mean, sigma, barrier, approxStateStep)
+    if cdfKey not in _cdfCache:
+        if len(_cdfCache) >= _maxKernelCacheSize:
+            _cdfCache.clear()
+
+        # The two crossing probability vectors are stacked into a single
+        # 2 x S array, so that both crossing probabilities come out of one
+        # matrix-vector product against the state probabilities.
+        cdfs = np.empty((2, states.size), dtype=np.float32)
+        cdfs[0] = 1 - _normcdf(barrier - states, mean, sigma)
+        cdfs[1] = _normcdf(-barrier - states, mean, sigma)
+        cdfs.setflags(write=False)
+        _cdfCache[cdfKey] = cdfs
+    return _pdfKernelCache[kernelKey], _cdfCache[cdfKey]
+
+
+def _propagate(kernel, cdfs, insideBarriers, prStates,
+               probUpCrossing, probDownCrossing, startTime, numSteps):
+    """
+    Runs the state-evolution recurrence of get_trial_likelihood over a span of
+    time steps during which the transition kernels are fixed, filling in the
+    state probabilities and the barrier-crossing probabilities in place. This
+    function is written in the numpy subset supported by numba, so that it can
+    be JIT-compiled when numba is available.
+    Args:
+      kernel: 1-dimensional numpy array with the probabilities of moving
+          between states as a function of the (signed) distance between them,
+          scaled by the state step.
+      cdfs: 2 x S numpy array whose rows are the probabilities of crossing
+          the upper and the lower barrier from each of the S states.
+      insideBarriers: float32 numpy array with value 1 for the states that
+          are inside the barriers and 0 elsewhere.
+      prStates: 2-dimensional numpy array with size S x T, where S is the
+          number of states and T is the number of time steps, containing the
+          state probabilities; written in place.
+      probUpCrossing: numpy array with size T containing the probabilities of
+          crossing the upper barrier at each time step; written in place.
+      probDownCrossing: numpy array with size T containing the probabilities
+          of crossing the lower barrier at each time step; written in place.
+      startTime: integer, first time step to be computed.
+      numSteps: integer, number of time steps to be computed.
+    Returns:
+      The index of the first time step that was not computed.
+    """
+    halfWidth = (kernel.size - 1) // 2
+    numStates = prStates.shape[0]
+
+    # The probability mass inside the barriers is carried from one step to
+    # the next, so that each step only needs one sum (over the new state
+    # probabilities) rather than a second one over the previous ones.
+    sumIn = np.sum(prStates[:, startTime - 1])
+    stepsSinceRenorm = 0
+    for time in range(startTime, startTime + numSteps):
+        # The column slice strides across the S x T matrix; a contiguous
+        # copy keeps the convolution and the dot product below on packed
+        # data (and silences numba's performance warning about dot on
+        # non-contiguous operands).
+        prStatesPrev = np.ascontiguousarray(prStates[:, time - 1])
+
+        # Once virtually all probability mass has been absorbed by the
+        # barriers, the crossing probability at every remaining time step is
+        # bounded by the residual mass: fill the rest of the span with zeros
+        # and stop iterating.
+        if sumIn < _probMassTolerance:
+            for t in range(time, startTime + numSteps):
+                prStates[:, t] = prStatesPrev
+                probUpCrossing[t] = 0
+                probDownCrossing[t] = 0
+            break
+
+        # Update the probability of the states that remain inside the
+        # barriers. The probability of being in state B is the sum, over all
+        # states A, of the probability of being in A at the previous time
+        # step times the probability of changing from A to B. Since the
+        # transition probability depends only on the distance between the
+        # states, this is a 1-dimensional convolution with the truncated
+        # transition kernel. States outside the barriers are zeroed with a
+        # branchless mask multiplication.
+        conv = np.convolve(prStatesPrev, kernel)
+        prStatesNew = conv[halfWidth:halfWidth + numStates] * insideBarriers
+
+        # Calculate the probabilities of crossing the up barrier and the down
+        # barrier. This is given by the sum, over all states A, of the
+        # probability of being in A at the previous time step times the
+        # probability of crossing the barrier if A is the previous state.
+        # Both crossings come out of a single matrix-vector product against
+        # the stacked cdf array, which reads the state probabilities once.
+        crossings = np.dot(cdfs, prStatesPrev)
+        tempUpCross = crossings[0]
+        tempDownCross = crossings[1]
+
+        # Renormalize to cope with numerical approximations. With the kernel
+        # truncated at machine-negligible mass the per-step conservation
+        # error is tiny, so the renormalization only runs when the error has
+        # accumulated past the tolerance, or periodically as a safety net.
+        sumNew = np.sum(prStatesNew)
+        sumCurrent = sumNew + tempUpCross + tempDownCross
+
+        # At extreme parameter values (e.g. very small sigma) the kernel and
+        # the crossing probabilities can underflow to exactly zero in
+        # float32, leaving no mass to renormalize; zero-fill the rest of the
+        # span instead of dividing by zero below.
+        if sumCurrent <= 0:
+            for t in range(time, startTime + numSteps):
+                prStates[:, t] = prStatesNew
+                probUpCrossing[t] = 0
+                probDownCrossing[t] = 0
+            break
+
+        stepsSinceRenorm += 1
+        if (abs(1 - sumCurrent / sumIn) > _renormTolerance or
+                stepsSinceRenorm >= _renormInterval):
+            normFactor = sumIn / sumCurrent
+            stepsSinceRenorm = 0
+
+            # Update the probabilities of each state and the probabilities
+            # of crossing each barrier at this time step.
+            prStates[:, time] = prStatesNew * normFactor
+            probUpCrossing[time] = tempUpCross * normFactor
+            probDownCrossing[time] = tempDownCross * normFactor
+            sumIn = sumNew * normFactor
+        else:
+            prStates[:, time] = prStatesNew
+            probUpCrossing[time] = tempUpCross
+            probDownCrossing[time] = tempDownCross
+            sumIn = sumNew
+    return startTime + numSteps
+
+
+if njit is not None:
+    # fastmath relaxes IEEE ordering so the compiler can vectorize the
+    # convolution and the reductions; the recurrence renormalizes itself, so
+    # the relaxed arithmetic is safe here.
+    _propagate = njit(cache=True, fastmath=True)(_propagate)
 
 
 class DDMTrial(object):
@@ -67,6 +344,52 @@ def unwrap_ddm_get_trial_likelihood(arg, **kwarg):
     return DDM.get_trial_likelihood(*arg, **kwarg)
 
 
+def unwrap_ddm_get_model_likelihoods(arg, **kwarg):
+    """
+    Wrapper for DDM.get_model_likelihoods(), intended for parallel computation
+    using a threadpool. This method should stay outside the class, allowing it
+    to be pickled (as required by multiprocessing).
+    Args:
+      params: same arguments required by DDM.get_model_likelihoods().
+    Returns:
+      The output of DDM.get_model_likelihoods().
+    """
+    # Dispatch through the model instance so that subclasses (e.g. the aDDM)
+    # use their own get_model_likelihoods override.
+    return arg[0].get_model_likelihoods(*arg[1:], **kwarg)
+
+
+def parallel_model_likelihoods(models, trials, timeStep=10, stateStep=0.1,
+                               numThreads=4):
+    """
+    Uses a threadpool to compute the likelihood of the data from a set of
+    trials under each model of a grid search, parallelizing across models.
+    Each worker evaluates one model over all trials, so the pool dispatches
+    one task per model instead of one task per (model, trial) pair, which
+    keeps the scheduling and pickling overhead proportional to the number of
+    models.
+    Args:
+      models: list of DDM objects (or objects of a subclass of DDM).
+      trials: list of DDMTrial objects.
+      timeStep: integer, value in milliseconds to be used for binning the
+          time axis.
+      stateStep: float, to be used for binning the RDV axis.
+      numThreads: int, number of threads to be used in the threadpool.
+    Returns:
+      A dict indexed by model params, where each entry is a numpy array with
+          the likelihoods obtained for the given trials.
+    """
+    pool = Pool(min(numThreads, len(models)))
+    likelihoods = pool.map(unwrap_ddm_get_model_likelihoods,
+                           zip(models,
+                               [trials] * len(models),
+                               [timeStep] * len(models),
+                               [stateStep] * len(models)))
+    pool.close()
+    return dict((model.params, modelLikelihoods)
+                for model, modelLikelihoods in zip(models, likelihoods))
+
+
 class DDM(object):
     """
     Implementation of the traditional drift-diffusion model (DDM), as described
@@ -99,6 +422,102 @@ class DDM(object):
         self.params = (d, sigma)
 
 
+    def _get_crossing_probabilities(self, valueDiff, numTimeSteps, timeStep,
+                                    approxStateStep):
+        """
+        Propagates the state probabilities over numTimeSteps time steps for
+        the given difference in item values, which together with the model
+        parameters fully determines the dynamics of a DDM trial.
+        Args:
+          valueDiff: difference between the value of the left item and the
+              value of the right item.
+          numTimeSteps: integer, number of time steps to propagate over.
+          timeStep: integer, value in milliseconds to be used for binning the
+              time axis.
+          approxStateStep: float, to be used for binning the RDV axis.
+        Returns:
+          A tuple (prStates, probUpCrossing, probDownCrossing), where
+              prStates is a numpy matrix with the state probabilities at each
+              time step and probUpCrossing and probDownCrossing are numpy
+              arrays with the probability of crossing each barrier at each
+              time step.
+        """
+        # The values of the barriers can change over time.
+        decay = 0  # decay = 0 means barriers are constant.
+        if decay == 0:
+            barrierUp = np.full(numTimeSteps, self.barrier, dtype=np.float32)
+        else:
+            barrierUp = (self.barrier /
+                         (1 + decay * np.arange(numTimeSteps))).astype(
+                             np.float32)
+        barrierDown = -barrierUp
+
+        # Obtain the discretized state space (cached across models and
+        # trials).
+        stateStep, states = _get_state_space(self.barrier, approxStateStep)
+
+        # Find the state corresponding to the bias parameter.
+        biasState = np.argmin(np.absolute(states - self.bias))
+
+        # Initial probability for all states is zero, except the bias state,
+        # for which the initial probability is one.
+        prStates = np.zeros((states.size, numTimeSteps), dtype=np.float32)
+        prStates[biasState,0] = 1
+
+        # The probability of crossing each barrier over the time of the trial.
+        probUpCrossing = np.zeros(numTimeSteps, dtype=np.float32)
+        probDownCrossing = np.zeros(numTimeSteps, dtype=np.float32)
+
+        if decay != 0:
+            changeUp = np.subtract(barrierUp, states.reshape(states.size, 1))
+            changeDown = np.subtract(barrierDown,
+                                     states.reshape(states.size, 1))
+
+        # We use a normal distribution to model changes in RDV
+        # stochastically. The mean of the distribution (the change most likely
+        # to occur) is calculated from the model parameter d and from the item
+        # values, except during non-decision time, in which the mean is zero.
+        drift = self.d * valueDiff
+        ndtSteps = min(self.nonDecisionTime // timeStep, numTimeSteps - 1)
+
+        if decay == 0:
+            insideBarriers = ((states < barrierUp[0]) &
+                              (states > barrierDown[0])).astype(np.float32)
+
+            # Propagate the state probabilities over two spans with fixed
+            # kernels: the non-decision time (zero mean) and the remainder of
+            # the trial (constant drift).
+            time = 1
+            for mean, numSteps in ((0, ndtSteps),
+                                   (drift, numTimeSteps - 1 - ndtSteps)):
+                if numSteps < 1:
+                    continue
+                kernel, cdfs = _get_transition_kernels(
+                    mean, self.sigma, self.barrier, approxStateStep)
+                time = _propagate(kernel, cdfs, insideBarriers, prStates,
+                                  probUpCrossing, probDownCrossing, time,
+                                  numSteps)
+        else:
+            # With time-varying barriers the kernels change at every time
+            # step, so they are rebuilt and propagated one step at a time.
+            kernelOffsets = np.arange(-(states.size - 1),
+                                      states.size) * stateStep
+            for time in range(1, numTimeSteps):
+                mean = 0 if time <= ndtSteps else drift
+                kernel = (stateStep * _normpdf(kernelOffsets, mean,
+                                               self.sigma)).astype(np.float32)
+                cdfs = np.empty((2, states.size), dtype=np.float32)
+                cdfs[0] = 1 - _normcdf(changeUp[:, time], mean, self.sigma)
+                cdfs[1] = _normcdf(changeDown[:, time], mean, self.sigma)
+                insideBarriers = ((states < barrierUp[time]) &
+                                  (states > barrierDown[time])).astype(
+                                      np.float32)
+                _propagate(kernel, cdfs, insideBarriers, prStates,
+                           probUpCrossing, probDownCrossing, time, 1)
+
+        return prStates, probUpCrossing, probDownCrossing
+
+
     def get_trial_likelihood(self, trial, timeStep=10, approxStateStep=0.1,
                              plotTrial=False):
         """
@@ -120,90 +539,10 @@ class DDM(object):
             raise RuntimeError(u"Trial response time is smaller than time "
                                "step.")
 
-        # The values of the barriers can change over time.
-        decay = 0  # decay = 0 means barriers are constant.
-        barrierUp = self.barrier * np.ones(numTimeSteps)
-        barrierDown = -self.barrier * np.ones(numTimeSteps)
-        for t in range(1, numTimeSteps):
-            barrierUp[t] = self.barrier / (1 + (decay * t))
-            barrierDown[t] = -self.barrier / (1 + (decay * t))
-
-        # Obtain correct state step.
-        halfNumStateBins = np.ceil(self.barrier / approxStateStep)
-        stateStep = self.barrier / (halfNumStateBins + 0.5)
-
-        # The vertical axis is divided into states.
-        states = np.arange(barrierDown[0] + (stateStep / 2),
-                           barrierUp[0] - (stateStep / 2) + stateStep,
-                           stateStep)
-
-        # Find the state corresponding to the bias parameter.
-        biasState = np.argmin(np.absolute(states - self.bias))
-
-        # Initial probability for all states is zero, except the bias state,
-        # for which the initial probability is one.
-        prStates = np.zeros((states.size, numTimeSteps))
-        prStates[biasState,0] = 1
-
-        # The probability of crossing each barrier over the time of the trial.
-        probUpCrossing = np.zeros(numTimeSteps)
-        probDownCrossing = np.zeros(numTimeSteps)
-
-        changeMatrix = np.subtract(states.reshape(states.size, 1), states)
-        changeUp = np.subtract(barrierUp, states.reshape(states.size, 1))
-        changeDown = np.subtract(barrierDown, states.reshape(states.size, 1))
-
-        elapsedNDT = 0
-
-        # Iterate over the time of this trial.
-        for time in range(1, numTimeSteps):
-            # We use a normal distribution to model changes in RDV
-            # stochastically. The mean of the distribution (the change most
-            # likely to occur) is calculated from the model parameter d and
-            # from the item values, except during non-decision time, in which
-            # the mean is zero.
-            if elapsedNDT < self.nonDecisionTime // timeStep:
-                mean = 0
-                elapsedNDT += 1
-            else:
-                mean = self.d * (trial.valueLeft - trial.valueRight)
-
-            # Update the probability of the states that remain inside the
-            # barriers. The probability of being in state B is the sum, over
-            # all states A, of the probability of being in A at the previous
-            # time step times the probability of changing from A to B. We
-            # multiply the probability by the stateStep to ensure that the area
-            # under the curves for the probability distributions probUpCrossing
-            # and probDownCrossing add up to 1.
-            prStatesNew = (stateStep *
-                           np.dot(norm.pdf(changeMatrix, mean, self.sigma),
-                           prStates[:,time-1]))
-            prStatesNew[(states >= barrierUp[time]) |
-                        (states <= barrierDown[time])] = 0
-
-            # Calculate the probabilities of crossing the up barrier and the
-            # down barrier. This is given by the sum, over all states A, of the
-            # probability of being in A at the previous timestep times the
-            # probability of crossing the barrier if A is the previous state.
-            tempUpCross = np.dot(
-                prStates[:,time-1],
-                (1 - norm.cdf(changeUp[:, time], mean, self.sigma)))
-            tempDownCross = np.dot(
-                prStates[:,time-1],
-                norm.cdf(changeDown[:, time], mean, self.sigma))
-
-            # Renormalize to cope with numerical approximations.
-            sumIn = np.sum(prStates[:,time-1])
-            sumCurrent = np.sum(prStatesNew) + tempUpCross + tempDownCross
-            prStatesNew = prStatesNew * sumIn / sumCurrent
-            tempUpCross = tempUpCross * sumIn / sumCurrent
-            tempDownCross = tempDownCross * sumIn / sumCurrent
-
-            # Update the probabilities of each state and the probabilities of
-            # crossing each barrier at this timestep.
-            prStates[:, time] = prStatesNew
-            probUpCrossing[time] = tempUpCross
-            probDownCrossing[time] = tempDownCross
+        prStates, probUpCrossing, probDownCrossing = (
+            self._get_crossing_probabilities(
+                trial.valueLeft - trial.valueRight, numTimeSteps, timeStep,
+                approxStateStep))
 
         # Compute the likelihood contribution of this trial based on the final
         # choice.
@@ -225,6 +564,59 @@ class DDM(object):
         return likelihood
 
 
+    def get_model_likelihoods(self, trials, timeStep=10, stateStep=0.1):
+        """
+        Computes the likelihood of the data from a set of trials for these
+        particular model parameters.
+        Args:
+          trials: list of DDMTrial objects.
+          timeStep: integer, value in milliseconds to be used for binning the
+              time axis.
+          stateStep: float, to be used for binning the RDV axis.
+        Returns:
+          A numpy array with the likelihoods obtained for the given trials.
+        """
+        # The per-trial metadata is pulled out of the trial objects into
+        # contiguous arrays once, so the grouping and the readoff below scan
+        # packed data instead of chasing attribute pointers per trial.
+        numTrials = len(trials)
+        lastSteps = np.fromiter((trial.RT // timeStep for trial in trials),
+                                dtype=np.int64, count=numTrials) - 1
+        if numTrials > 0 and np.min(lastSteps) < 0:
+            raise RuntimeError(u"Trial response time is smaller than time "
+                               "step.")
+        choices = np.fromiter((trial.choice for trial in trials),
+                              dtype=np.int64, count=numTrials)
+        valueDiffs = np.fromiter(
+            (trial.valueLeft - trial.valueRight for trial in trials),
+            dtype=np.float64, count=numTrials)
+
+        # Trials with the same value difference share the exact same
+        # propagation dynamics, so each group of such trials is propagated
+        # once, up to the response time of its longest trial, and every
+        # trial's likelihood is read off at its own final time step. The
+        # likelihoods are stored in float32, matching the precision of the
+        # propagation they come out of; log sums over them should accumulate
+        # in float64.
+        likelihoods = np.zeros(numTrials, dtype=np.float32)
+        for valueDiff in np.unique(valueDiffs):
+            trialIndexes = np.nonzero(valueDiffs == valueDiff)[0]
+            groupSteps = lastSteps[trialIndexes]
+            numTimeSteps = int(np.max(groupSteps)) + 1
+            _, probUpCrossing, probDownCrossing = (
+                self._get_crossing_probabilities(valueDiff, numTimeSteps,
+                                                 timeStep, stateStep))
+            groupChoices = choices[trialIndexes]
+            groupLikelihoods = np.zeros(trialIndexes.size, dtype=np.float32)
+            leftMask = groupChoices == -1
+            rightMask = groupChoices == 1
+            groupLikelihoods[leftMask] = probUpCrossing[groupSteps[leftMask]]
+            groupLikelihoods[rightMask] = probDownCrossing[
+                groupSteps[rightMask]]
+            likelihoods[trialIndexes] = np.maximum(groupLikelihoods, 0)
+        return likelihoods
+
+
     def parallel_get_likelihoods(self, ddmTrials, timeStep=10, stateStep=0.1,
                                  numThreads=4):
         """
@@ -240,11 +632,15 @@ class DDM(object):
           A list of likelihoods obtained for the given trials and model.
         """
         pool = Pool(numThreads)
+        # Hand each worker a chunk of trials at a time; the default chunksize
+        # of 1 would cost one IPC round trip per trial.
         likelihoods = pool.map(unwrap_ddm_get_trial_likelihood,
                                zip([self] * len(ddmTrials),
                                    ddmTrials,
                                    [timeStep] * len(ddmTrials),
-                                   [stateStep] * len(ddmTrials)))
+                                   [stateStep] * len(ddmTrials)),
+                               chunksize=max(
+                                   1, len(ddmTrials) // (4 * numThreads)))
         pool.close()
         return likelihoods
 
@@ -262,7 +658,8 @@ class DDM(object):
         """
         RDV = self.bias
         time = 0
-        elapsedNDT = 0
+        chunkSize = 1024
+        ndtSteps = self.nonDecisionTime // timeStep
         while True:
             # If the RDV hit one of the barriers, the trial is over.
             if RDV >= self.barrier or RDV <= -self.barrier:
@@ -273,16 +670,30 @@ class DDM(object):
                     choice = 1
                 break
 
-            if elapsedNDT < self.nonDecisionTime // timeStep:
+            # Sample the changes in RDV from the distribution in chunks, so
+            # that the random number generator is not called once per time
+            # step. During non-decision time, the mean of the distribution is
+            # zero; chunks are truncated so that they do not straddle the end
+            # of the non-decision time.
+            if time < ndtSteps:
                 mean = 0
-                elapsedNDT += 1
+                numSamples = min(chunkSize, ndtSteps - time)
             else:
                 mean = self.d * (valueLeft - valueRight)
-
-            # Sample the change in RDV from the distribution.
-            RDV += np.random.normal(mean, self.sigma)
-
-            time += 1
+                numSamples = chunkSize
+            path = RDV + np.cumsum(
+                mean + self.sigma * np.random.standard_normal(numSamples))
+
+            # Find the first time step in the chunk at which the RDV crossed
+            # one of the barriers, if any.
+            crossed = (path >= self.barrier) | (path <= -self.barrier)
+            if crossed.any():
+                firstCrossing = np.argmax(crossed)
+                RDV = path[firstCrossing]
+                time += firstCrossing + 1
+            else:
+                RDV = path[-1]
+                time += numSamples
 
         return DDMTrial(RT, choice, valueLeft, valueRight)
 
@@ -30,11 +30,12 @@ recovered through a maximum a posteriori estimation procedure.
 
 from __future__ import absolute_import, division
 
+import numpy as np
 import pkg_resources
 
 from builtins import range, str
 
-from .ddm import DDMTrial, DDM
+from .ddm import DDMTrial, DDM, parallel_model_likelihoods
 from .util import load_trial_conditions_from_csv
 
 
@@ -71,42 +72,38 @@ def main(d, sigma, rangeD, rangeSigma, trialsFileName=None,
                       str(valueLeft) + u", " + str(valueRight) + u").")
                 raise
 
-    # Get likelihoods for all models and all artificial trials.
+    # Create all models to be used in the grid search.
     numModels = len(rangeD) * len(rangeSigma)
-    likelihoods = dict()
     models = list()
-    posteriors = dict()
     for d in rangeD:
         for sigma in rangeSigma:
-            model = DDM(d, sigma)
-            if verbose:
-                print(u"Computing likelihoods for model " + str(model.params) +
-                      u"...")
-            try:
-                likelihoods[model.params] = model.parallel_get_likelihoods(
-                    trials, numThreads=numThreads)
-            except:
-                print(u"An exception occurred during the likelihood "
-                      "computations for model " + str(model.params) + u".")
-                raise
-            models.append(model)
-            posteriors[model.params] = 1 / numModels
+            models.append(DDM(d, sigma))
 
-    # Compute the posteriors.
+    # Get likelihoods for all models and all artificial trials, parallelizing
+    # over models.
+    if verbose:
+        print(u"Computing likelihoods for all models...")
+    try:
+        likelihoods = parallel_model_likelihoods(models, trials,
+                                                 numThreads=numThreads)
+    except:
+        print(u"An exception occurred during the likelihood computations.")
+        raise
+
+    # Compute the posteriors, keeping the models' posteriors and likelihoods
+    # in parallel arrays so that each trial's Bayesian update is a vectorized
+    # operation over all models.
+    likelihoodsArray = np.array(
+        [likelihoods[model.params] for model in models])
+    posteriorsArray = np.full(numModels, 1 / numModels)
     for t in range(len(trials)):
-        # Get the denominator for normalizing the posteriors.
-        denominator = 0
-        for model in models:
-            denominator += (posteriors[model.params] *
-                            likelihoods[model.params][t])
+        posteriorTimesLikelihood = posteriorsArray * likelihoodsArray[:, t]
+        denominator = np.sum(posteriorTimesLikelihood)
         if denominator == 0:
             continue
-
-        # Calculate the posteriors after this trial.
-        for model in models:
-            prior = posteriors[model.params]
-            posteriors[model.params] = (likelihoods[model.params][t] *
-                prior / denominator)
+        posteriorsArray = posteriorTimesLikelihood / denominator
+    posteriors = dict(zip([model.params for model in models],
+                          posteriorsArray))
 
     if verbose:
         for model in models:
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+"""
+Copyright (C) 2017, California Institute of Technology
+
+This file is part of addm_toolbox.
+
+addm_toolbox is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+addm_toolbox is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with addm_toolbox. If not, see <http://www.gnu.org/licenses/>.
+
+---
+
+Module: ddm_test.py
+Author: Gabriela Tavares, gtavares@caltech.edu
+
+Unit tests for the ddm.py module.
+"""
+
+from __future__ import absolute_import, division
+
+import numpy as np
+import unittest
+
+from scipy.stats import norm
+
+from .ddm import DDM, DDMTrial
+
+
+def float64_trial_likelihood(model, trial, timeStep=10, approxStateStep=0.1):
+    """
+    Computes the likelihood of the data from a single DDM trial in full
+    float64 precision, using the dense state transition matrix. Reference
+    implementation for the float32 kernels used by DDM.get_trial_likelihood.
+    Args:
+      model: DDM object.
+      trial: DDMTrial object.
+      timeStep: integer, value in milliseconds to be used for binning the
+          time axis.
+      approxStateStep: float, to be used for binning the RDV axis.
+    Returns:
+      The likelihood obtained for the given trial and model.
+    """
+    numTimeSteps = trial.RT // timeStep
+
+    halfNumStateBins = np.ceil(model.barrier / approxStateStep)
+    stateStep = model.barrier / (halfNumStateBins + 0.5)
+    states = np.arange(-model.barrier + (stateStep / 2),
+                       model.barrier - (stateStep / 2) + stateStep, stateStep)
+    biasState = np.argmin(np.absolute(states - model.bias))
+    prStates = np.zeros(states.size)
+    prStates[biasState] = 1
+    probUpCrossing = 0.
+    probDownCrossing = 0.
+
+    changeMatrix = np.subtract(states.reshape(states.size, 1), states)
+    changeUp = model.barrier - states
+    changeDown = -model.barrier - states
+
+    drift = model.d * (trial.valueLeft - trial.valueRight)
+    ndtSteps = min(model.nonDecisionTime // timeStep, numTimeSteps - 1)
+    for time in range(1, numTimeSteps):
+        mean = 0 if time <= ndtSteps else drift
+        prStatesNew = np.dot(stateStep * norm.pdf(changeMatrix, mean,
+                                                  model.sigma), prStates)
+        tempUpCross = np.dot(prStates, 1 - norm.cdf(changeUp, mean,
+                                                    model.sigma))
+        tempDownCross = np.dot(prStates, norm.cdf(changeDown, mean,
+                                                  model.sigma))
+
+        sumIn = np.sum(prStates)
+        sumCurrent = np.sum(prStatesNew) + tempUpCross + tempDownCross
+        normFactor = sumIn / sumCurrent
+        prStates = prStatesNew * normFactor
+        probUpCrossing = tempUpCross * normFactor
+        probDownCrossing = tempDownCross * normFactor
+
+    if trial.choice == -1 and probUpCrossing > 0:
+        return probUpCrossing
+    if trial.choice == 1 and probDownCrossing > 0:
+        return probDownCrossing
+    return 0
+
+
+class TestTrialLikelihoodPrecision(unittest.TestCase):
+    def compare_likelihoods(self, trial):
+        model = DDM(0.006, 0.08)
+        expected = float64_trial_likelihood(model, trial)
+        actual = model.get_trial_likelihood(trial)
+        self.assertAlmostEqual(expected, actual, delta=1e-5)
+
+    def test_left_choice_trial(self):
+        self.compare_likelihoods(DDMTrial(RT=800, choice=-1, valueLeft=3,
+                                          valueRight=0))
+
+    def test_right_choice_trial(self):
+        self.compare_likelihoods(DDMTrial(RT=1200, choice=1, valueLeft=1,
+                                          valueRight=2))
+
+    def test_equal_values_trial(self):
+        self.compare_likelihoods(DDMTrial(RT=1000, choice=1, valueLeft=2,
+                                          valueRight=2))
+
+
+if __name__ == u"__main__":
+    unittest.main()
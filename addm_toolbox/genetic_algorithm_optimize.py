@@ -45,6 +45,11 @@ from .util import load_data_from_csv, convert_item_values
 
 # Global variables.
 dataTrials = []
+verboseNLL = False
+
+# Generator for the trial subsampling; choice with shuffle=False samples
+# without replacement without permuting the full index range.
+_rng = np.random.default_rng()
 
 
 def evaluate(individual):
@@ -61,20 +66,21 @@ def evaluate(individual):
     d = individual[0]
     theta = individual[1]
     sigma = individual[2]
-    model = aDDM(d, sigma, theta) 
+    model = aDDM(d, sigma, theta)
 
-    logLikelihood = 0
-    for trial in dataTrials:
-        try:
-            likelihood = model.get_trial_likelihood(trial)
-        except:
-            print(u"An exception occurred during the likelihood " +
-                  "computations for model " + str(model.params) + u".")
-            raise
-        if likelihood != 0:
-            logLikelihood += np.log(likelihood)
+    try:
+        likelihoods = model.get_model_likelihoods(dataTrials)
+    except:
+        print(u"An exception occurred during the likelihood " +
+              "computations for model " + str(model.params) + u".")
+        raise
+    # The likelihoods are float32; the log sum accumulates in float64 to
+    # avoid cancellation across many small terms.
+    logLikelihood = np.sum(np.log(likelihoods[likelihoods != 0],
+                                  dtype=np.float64))
 
-    print(u"NLL for " + str(individual) + u": " + str(-logLikelihood))
+    if verboseNLL:
+        print(u"NLL for " + str(individual) + u": " + str(-logLikelihood))
     if logLikelihood != 0:
         return -logLikelihood,
     else:
@@ -107,7 +113,8 @@ def main(lowerBoundD=0.0001, upperBoundD=0.09, lowerBoundSigma=0.001,
       numThreads: int, size of the thread pool.
       verbose: boolean, whether or not to increase output verbosity.
     """
-    global dataTrials
+    global dataTrials, verboseNLL
+    verboseNLL = verbose
 
     # Load experimental data from CSV file.
     if verbose:
@@ -121,15 +128,16 @@ def main(lowerBoundD=0.0001, upperBoundD=0.09, lowerBoundSigma=0.001,
     data = load_data_from_csv(expdataFileName, fixationsFileName,
                               convertItemValues=convert_item_values)
 
-    # Get correct subset of trials.
+    # Get correct subset of trials. The subset is sampled once, before the
+    # optimization starts, so that fitness evaluations are deterministic
+    # across generations.
     subjectIds = ([str(subj) for subj in subjectIds] if subjectIds
                   else list(data))
     for subjectId in subjectIds:
         numTrials = (trialsPerSubject if trialsPerSubject >= 1
                      else len(data[subjectId]))
-        trialSet = np.random.choice(
-            [trialId for trialId in range(len(data[subjectId]))],
-            numTrials, replace=False)
+        trialSet = _rng.choice(len(data[subjectId]), size=numTrials,
+                               replace=False, shuffle=False)
         dataTrials.extend([data[subjectId][t] for t in trialSet])
 
     creator.create(u"FitnessMin", base.Fitness, weights=(-1.0,))
@@ -52,6 +52,30 @@ from .util import (load_trial_conditions_from_csv, load_data_from_csv,
 
 
 
+def _dist_array_to_dict(distArray, valueDiffs, bins):
+    """
+    Converts a fixation distribution stored as a contiguous numpy array into
+    the dict of dicts of dicts format expected by aDDM.simulate_trial.
+    Args:
+      distArray: numpy array with shape (number of fixation types, number of
+          value differences, number of time bins).
+      valueDiffs: list of ints, value differences corresponding to the second
+          axis of distArray.
+      bins: list of ints, time bins corresponding to the third axis of
+          distArray.
+    Returns:
+      A dict of dicts of dicts, indexed first by fixation type, then by value
+          difference, then by time bin.
+    """
+    fixDist = dict()
+    for f in range(distArray.shape[0]):
+        fixDist[f + 1] = dict()
+        for v, valueDiff in enumerate(valueDiffs):
+            fixDist[f + 1][valueDiff] = dict(
+                zip(bins, distArray[f, v, :].tolist()))
+    return fixDist
+
+
 def main(d, sigma, theta, trialsFileName=None, expdataFileName=None,
          fixationsFileName=None, binStep=10, maxFixBin=3000, numFixDists=3,
          numIterations=3, simulationsPerCondition=800, subjectIds=[],
@@ -108,25 +132,23 @@ def main(d, sigma, theta, trialsFileName=None, expdataFileName=None,
     fixationData = get_empirical_distributions(
         data, subjectIds=subjectIds, useOddTrials=False, useEvenTrials=True)
 
-    # Create original empirical distributions of fixations.
-    empiricalFixDist = dict()
+    # Create original empirical distributions of fixations. Distributions are
+    # kept in a contiguous array indexed by (fixation type, value difference,
+    # time bin), so that the counting and normalization steps below operate on
+    # whole arrays instead of nested dicts.
+    valueDiffs = list(range(-3,4))
+    numBins = len(bins)
+    empiricalFixDist = np.zeros((numFixDists, len(valueDiffs), numBins))
     for numFix in range(1, numFixDists + 1):
-        empiricalFixDist[numFix] = dict()
-        for valueDiff in range(-3,4):
-            empiricalFixDist[numFix][valueDiff] = dict()
-            for bin in bins:
-                empiricalFixDist[numFix][valueDiff][bin] = 0
-            for fixTime in fixationData.fixations[numFix][valueDiff]:
-                bin = binStep * min((fixTime // binStep) + 1, len(bins))
-                empiricalFixDist[numFix][valueDiff][bin] += 1
+        for v, valueDiff in enumerate(valueDiffs):
+            fixTimes = np.asarray(fixationData.fixations[numFix][valueDiff])
+            binIdxs = np.minimum(fixTimes.astype(np.int64) // binStep,
+                                 numBins - 1)
+            empiricalFixDist[numFix - 1, v, :] = np.bincount(
+                binIdxs, minlength=numBins)
 
     # Normalize the distributions.
-    for numFix in range(1, numFixDists + 1):
-        for valueDiff in range(-3,4):
-            sumBins = sum(list(empiricalFixDist[numFix][valueDiff].values()))
-            for bin in bins:
-                empiricalFixDist[numFix][valueDiff][bin] = (
-                    empiricalFixDist[numFix][valueDiff][bin] / sumBins)
+    empiricalFixDist /= np.sum(empiricalFixDist, axis=2, keepdims=True)
 
     model = aDDM(d, sigma, theta)
     for it in range(numIterations):
@@ -134,6 +156,8 @@ def main(d, sigma, theta, trialsFileName=None, expdataFileName=None,
             print(u"Iteration " + str(it + 1) + u"/" + str(numIterations))
         # Generate simulations using the current empirical distributions and
         # the model parameters.
+        empiricalFixDistDict = _dist_array_to_dict(empiricalFixDist,
+                                                   valueDiffs, bins)
         simulTrials = list()
         for (valueLeft, valueRight) in trialConditions:
             for s in range(simulationsPerCondition):
@@ -142,7 +166,7 @@ def main(d, sigma, theta, trialsFileName=None, expdataFileName=None,
                         model.simulate_trial(
                             valueLeft, valueRight, fixationData,
                             numFixDists=numFixDists,
-                            fixationDist=empiricalFixDist, timeBins=bins))
+                            fixationDist=empiricalFixDistDict, timeBins=bins))
                 except:
                     print(u"An exception occurred while generating "
                           "artificial trial " + str(s) + u" for condition (" +
@@ -150,17 +174,8 @@ def main(d, sigma, theta, trialsFileName=None, expdataFileName=None,
                           u") (iteration " + str(it) + u").")
                     raise
 
-        countLastFix = dict()
-        countTotal = dict()
-        for numFix in range(1, numFixDists + 1):
-            countLastFix[numFix] = dict()
-            countTotal[numFix] = dict()
-            for valueDiff in range(-3,4):
-                countLastFix[numFix][valueDiff] = dict()
-                countTotal[numFix][valueDiff] = dict()
-                for bin in bins:
-                    countLastFix[numFix][valueDiff][bin] = 0
-                    countTotal[numFix][valueDiff][bin] = 0
+        countLastFix = np.zeros((numFixDists, len(valueDiffs), numBins))
+        countTotal = np.zeros((numFixDists, len(valueDiffs), numBins))
 
         for trial in simulTrials:
             # Count all item fixations, except last.
@@ -173,55 +188,41 @@ def main(d, sigma, theta, trialsFileName=None, expdataFileName=None,
                                   reversed(trial.fixTime)):
                 if not lastItemFixSkipped and (item == 1 or item == 2):
                     # Count last fixation (only if it was to an item).
-                    bin = binStep * min(
-                        (trial.uninterruptedLastFixTime // binStep) + 1,
-                        len(bins))
-                    vDiff = fixUnfixValueDiffs[item]
-                    countLastFix[numFix][vDiff][bin] += 1
-                    countTotal[numFix][vDiff][bin] += 1
+                    binIdx = min(
+                        int(trial.uninterruptedLastFixTime // binStep),
+                        numBins - 1)
+                    vDiffIdx = int(fixUnfixValueDiffs[item] - valueDiffs[0])
+                    countLastFix[numFix - 1, vDiffIdx, binIdx] += 1
+                    countTotal[numFix - 1, vDiffIdx, binIdx] += 1
                     lastItemFixSkipped = True
                     continue
                 if item == 1 or item == 2:
                     # Count item fixations other than the last one.
-                    bin = binStep * min((time // binStep) + 1, len(bins))
-                    vDiff = fixUnfixValueDiffs[item]
-                    countTotal[numFix][vDiff][bin] += 1
+                    binIdx = min(int(time // binStep), numBins - 1)
+                    vDiffIdx = int(fixUnfixValueDiffs[item] - valueDiffs[0])
+                    countTotal[numFix - 1, vDiffIdx, binIdx] += 1
                     if numFix < numFixDists:
                         numFix += 1
 
-        # Obtain true distributions of fixations.
-        trueFixDist = dict()
-        for numFix in range(1, numFixDists + 1):
-            trueFixDist[numFix] = dict()
-            for valueDiff in range(-3,4):
-                trueFixDist[numFix][valueDiff] = dict()
-                for bin in bins:
-                    probNotLastFix = 1
-                    if countTotal[numFix][valueDiff][bin] > 0:
-                        probNotLastFix = 1 - (
-                            countLastFix[numFix][valueDiff][bin] /
-                            countTotal[numFix][valueDiff][bin])
-                    if probNotLastFix == 0:
-                        trueFixDist[numFix][valueDiff][bin] = (
-                            empiricalFixDist[numFix][valueDiff][bin])
-                    else:
-                        trueFixDist[numFix][valueDiff][bin] = (
-                            empiricalFixDist[numFix][valueDiff][bin] /
-                            probNotLastFix)
+        # Obtain true distributions of fixations. Bins where the last-fixation
+        # probability is 1 (or where there is no data) keep their empirical
+        # values.
+        probNotLastFix = np.ones((numFixDists, len(valueDiffs), numBins))
+        np.divide(countTotal - countLastFix, countTotal, out=probNotLastFix,
+                  where=countTotal > 0)
+        trueFixDist = empiricalFixDist.copy()
+        np.divide(empiricalFixDist, probNotLastFix, out=trueFixDist,
+                  where=probNotLastFix > 0)
         # Normalize the distributions.
-        for numFix in range(1, numFixDists + 1):
-            for valueDiff in range(-3,4):
-                sumBins = sum(list(trueFixDist[numFix][valueDiff].values()))
-                if sumBins > 0:
-                    for bin in bins:
-                        trueFixDist[numFix][valueDiff][bin] = (
-                            trueFixDist[numFix][valueDiff][bin] /
-                            sumBins)
+        sumBins = np.sum(trueFixDist, axis=2, keepdims=True)
+        np.divide(trueFixDist, sumBins, out=trueFixDist, where=sumBins > 0)
 
         # Update empirical distributions using the current true distributions.
         empiricalFixDist = trueFixDist
 
     # Generate final simulations.
+    empiricalFixDistDict = _dist_array_to_dict(empiricalFixDist, valueDiffs,
+                                               bins)
     simulTrials = list()
     for (valueLeft, valueRight) in trialConditions:
         for s in range(simulationsPerCondition):
@@ -230,7 +231,7 @@ def main(d, sigma, theta, trialsFileName=None, expdataFileName=None,
                     model.simulate_trial(
                         valueLeft, valueRight, fixationData,
                         numFixDists=numFixDists,
-                        fixationDist=empiricalFixDist, timeBins=bins))
+                        fixationDist=empiricalFixDistDict, timeBins=bins))
             except:
                 print(u"An exception occurred while generating "
                       "artificial trial " + str(s) + u" for condition (" +
@@ -106,29 +106,24 @@ def load_data_from_csv(expdataFileName, fixationsFileName,
                            "required: parcode, trial, rt, choice, item_left "
                            "item_right")
 
+    # Convert the item values for all trials at once. The conversion is built
+    # on numpy ufuncs, so applying it to the whole columns avoids one pair of
+    # scalar ufunc calls per trial.
+    if convertItemValues:
+        df[u"item_left"] = convertItemValues(df[u"item_left"].values)
+        df[u"item_right"] = convertItemValues(df[u"item_right"].values)
+
+    # Group the dataframe by subject and trial in a single pass, instead of
+    # re-filtering the whole dataframe for every (subject, trial) pair.
     data = dict()
-    subjectIds = df.parcode.unique()
-    for subjectId in subjectIds:
+    for subjectId, dataSubject in df.groupby(u"parcode", sort=False):
         data[subjectId] = list()
-        dataSubject = np.array(
-            df.loc[df[u"parcode"]==subjectId,
-            [u"trial", u"rt", u"choice", u"item_left", u"item_right"]])
-        trialIds = np.unique(dataSubject[:,0]).tolist()
-        for trialId in trialIds:
-            dataTrial = np.array(
-                df.loc[(df[u"trial"]==trialId) & (df[u"parcode"]==subjectId),
-                [u"rt", u"choice", u"item_left", u"item_right"]])
-            itemLeft = dataTrial[0,2]
-            itemRight = dataTrial[0,3]
-            if convertItemValues:
-                data[subjectId].append(
-                    aDDMTrial(RT=dataTrial[0,0], choice=dataTrial[0,1],
-                              valueLeft=convertItemValues(itemLeft),
-                              valueRight=convertItemValues(itemRight)))
-            else:
-                data[subjectId].append(
-                    aDDMTrial(RT=dataTrial[0,0], choice=dataTrial[0,1],
-                              valueLeft=itemLeft, valueRight=itemRight))
+        for trialId, dataTrial in dataSubject.groupby(u"trial", sort=True):
+            data[subjectId].append(
+                aDDMTrial(RT=dataTrial[u"rt"].iloc[0],
+                          choice=dataTrial[u"choice"].iloc[0],
+                          valueLeft=dataTrial[u"item_left"].iloc[0],
+                          valueRight=dataTrial[u"item_right"].iloc[0]))
 
     # Load fixation data from CSV file.
     try:
@@ -143,20 +138,13 @@ def load_data_from_csv(expdataFileName, fixationsFileName,
         raise RuntimeError(u"Missing field in fixations file. Fields "
                            "required: parcode, trial, fix_item, fix_time")
 
-    subjectIds = df.parcode.unique()
-    for subjectId in subjectIds:
+    for subjectId, dataSubject in df.groupby(u"parcode", sort=False):
         if not subjectId in data:
             continue
-        dataSubject = np.array(
-            df.loc[df[u"parcode"]==subjectId,
-            [u"trial", u"fix_item", u"fix_time"]])
-        trialIds = np.unique(dataSubject[:,0]).tolist()
-        for t, trialId in enumerate(trialIds):
-            dataTrial = np.array(
-                df.loc[(df[u"trial"]==trialId) & (df[u"parcode"]==subjectId),
-                [u"fix_item", u"fix_time"]])
-            data[subjectId][t].fixItem = dataTrial[:,0]
-            data[subjectId][t].fixTime = dataTrial[:,1]
+        for t, (trialId, dataTrial) in enumerate(
+                dataSubject.groupby(u"trial", sort=True)):
+            data[subjectId][t].fixItem = dataTrial[u"fix_item"].values
+            data[subjectId][t].fixTime = dataTrial[u"fix_time"].values
     return data
 
 